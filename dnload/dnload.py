@@ -2,6 +2,8 @@
 """Script to read C/C++ source input and generate a minimal program."""
 
 import argparse
+import bisect
+import itertools
 import os
 import re
 import shutil
@@ -26,6 +28,62 @@ ELFLING_WORK = "elfling_modelCounters"
 ELFLING_UNCOMPRESSED = "_uncompressed"
 VIDEOCORE_PATH = "/opt/vc"
 
+ASCII7_CHARACTERS = bytes(bytearray(range(128)))
+
+COMPILER_FLAGS_CLANG = ("-Os", "-ffast-math", "-fno-asynchronous-unwind-tables", "-fno-exceptions", "-fno-rtti", "-fno-threadsafe-statics", "-fomit-frame-pointer")
+COMPILER_FLAGS_GCC = COMPILER_FLAGS_CLANG + ("-fsingle-precision-constant", "-fwhole-program")
+LINKER_FLAGS_CLANG = ("-nostdlib", "-Xlinker", "--strip-all")
+LINKER_FLAGS_GCC = ("-nostartfiles",) + LINKER_FLAGS_CLANG
+STRIP_FLAGS = ("-K", ".bss", "-K", ".text", "-K", ".data", "-R", ".comment", "-R", ".eh_frame", "-R", ".eh_frame_hdr", "-R", ".fini", "-R", ".gnu.hash", "-R", ".gnu.version", "-R", ".jcr", "-R", ".note", "-R", ".note.ABI-tag", "-R", ".note.tag")
+
+########################################
+# Regular expressions ##################
+########################################
+
+RE_ALIGN = re.compile(r'\.align\s+(\d+)')
+RE_COMM = re.compile(r'\s*\.comm\s+([^\s,]+)\s*,(.*)', re.IGNORECASE)
+RE_COMM_SIZE = re.compile(r'\s*(\d+)\s*,\s*(\d+).*')
+RE_COMMENT = re.compile(r'^\s*[#;].*', re.IGNORECASE)
+RE_DIRECTIVE = re.compile(r'\s*\.(bss|data|file|globl|ident|section|size|text|type)\s+', re.IGNORECASE)
+RE_FOOTER_AMD64 = re.compile(r'\s*(int\s+\$0x3|syscall)\s+.*', re.IGNORECASE)
+RE_FOOTER_IA32 = re.compile(r'\s*int\s+\$(0x3|0x80)\s+.*', re.IGNORECASE)
+RE_GLOBL = re.compile(r'\s*\.globl\s+(\S+).*', re.IGNORECASE)
+RE_GROUP = re.compile(r'GROUP\s*\(\s*(\S+)\s+', re.MULTILINE)
+RE_INTEGER = re.compile(r'\d+')
+RE_LABEL = re.compile(r'\s*\S+\:\s*')
+RE_LABEL_GLOBAL = re.compile(r'^([^\.:,\s\(]+):')
+RE_LABEL_LOCAL = re.compile(r'((\.L|_ZL)[^:,\s\(]+)')
+RE_LABEL_NAME = re.compile(r'\s*([^\s:]+)\:')
+RE_LIBRARY_VERBATIM = re.compile(r'lib.+\.so(\..*)?')
+RE_LINKER_SCRIPT = re.compile(r'.*linker script\S+\s*\n=+\s+(.*)\s+=+\s*\n.*', re.DOTALL)
+RE_LINKER_SCRIPT_REWRITE = re.compile(r'\n([^\n]+\s)(_end|_edata|__bss_start)(\s*=[^\n]+)\n|SEGMENT_START\s*\(\s*(\S+)\s*,\s*\d*x?\d+\s*\)')
+RE_LINKER_SCRIPT_START = re.compile(r'(SEGMENT_START.*\S)\s*\+\s*SIZEOF_HEADERS\s*;')
+RE_LOCAL = re.compile(r'\s*\.local\s+(\S+).*', re.IGNORECASE)
+RE_MOV = re.compile(r'\s*mov.*,\s*%(rbp|ebp|edx).*', re.IGNORECASE)
+RE_POP = re.compile(r'\s*(pop\S).*', re.IGNORECASE)
+RE_PUSH = re.compile(r'\s*(push\S).*%(\S+)', re.IGNORECASE)
+RE_SECTION = re.compile(r'^\s+\.section\s+\"?\.([a-zA-Z0-9_]+)[\.\s]')
+RE_START = re.compile(r'\s*\S*(_start)\S*\:.*', re.IGNORECASE)
+RE_SUB_SP = re.compile(r'\s*sub.*\s+[^\d]*(\d+),\s*%(rsp|esp)', re.IGNORECASE)
+RE_TYPE_OBJECT = re.compile(r'\s*.type\s+([^\s,]+),\s+@object', re.IGNORECASE)
+RE_XOR = re.compile(r'\s*xor.*\s+%(\S+)\s?,.*', re.IGNORECASE)
+RE_ZERO = re.compile(r'\s*\.zero\s+(\d+)', re.IGNORECASE)
+
+########################################
+# Struct packing #######################
+########################################
+
+def generate_struct_packers():
+  """Generate precompiled packers keyed by byte order mark, size and signedness."""
+  ret = {}
+  for bom in ("<", ">"):
+    for (size, unsigned_format, signed_format) in ((1, "B", "b"), (2, "H", "h"), (4, "I", "i"), (8, "Q", "q")):
+      ret[(bom, size, False)] = struct.Struct(bom + unsigned_format)
+      ret[(bom, size, True)] = struct.Struct(bom + signed_format)
+  return ret
+
+g_struct_packers = generate_struct_packers()
+
 ########################################
 # PlatformVar ##########################
 ########################################
@@ -45,19 +103,25 @@ def get_platform_combinations():
 class PlatformVar:
   """Platform-dependent variable."""
 
+  __slots__ = ("__name",)
+
   def __init__(self, name):
     """Initialize platform variable."""
     self.__name = name
 
   def get(self):
     """Get value associated with the name."""
+    if self.__name in g_platform_variable_cache:
+      return g_platform_variable_cache[self.__name]
     if not self.__name in g_platform_variables:
       raise RuntimeError("unknown platform variable '%s'" % (self.__name))
     current_var = g_platform_variables[self.__name]
     combinations = get_platform_combinations()
     for ii in combinations:
       if ii in current_var:
-        return current_var[ii]
+        ret = current_var[ii]
+        g_platform_variable_cache[self.__name] = ret
+        return ret
     raise RuntimeError("current platform %s not supported for variable '%s'" % (str(combinations), self.__name))
 
   def deconstructable(self):
@@ -110,6 +174,8 @@ g_platform_variables = {
   "start" : { "default" : "_start" },
   }
 
+g_platform_variable_cache = {}
+
 def platform_map_iterate(op):
   """Follow platform mapping chain once."""
   if op in g_platform_mapping:
@@ -125,11 +191,22 @@ def platform_map(op):
     op = found
   return op
 
+def platform_map_closure(op):
+  """Get set of all names in the platform mapping chain starting from given name."""
+  ret = set()
+  while op:
+    ret.add(op)
+    op = platform_map_iterate(op)
+  return ret
+
 def replace_platform_variable(name, op):
   """Destroy platform variable, replace with default."""
   if not name in g_platform_variables:
     raise RuntimeError("trying to destroy nonexistent platform variable '%s'" % (name))
   g_platform_variables[name] = { "default" : op }
+  g_platform_variable_cache.pop(name, None)
+
+g_osarch_aliases = platform_map_closure(g_osarch)
 
 ########################################
 # Assembler ############################
@@ -154,6 +231,7 @@ class Assembler:
       self.__short = "dw"
       self.__word = "dd"
       self.__string = "db"
+    self.__size_directives = { 1 : self.__byte, 2 : self.__short, 4 : self.__word, 8 : self.__quad }
 
   def assemble(self, src, dst):
     """Assemble a file."""
@@ -168,55 +246,35 @@ class Assembler:
 
   def format_block_comment(self, desc, length = 40):
     """Get a block-formatted comment."""
-    block_text = ""
-    for ii in range(length):
-      block_text += self.__comment
-    block_text += "\n"
+    block_text = self.__comment * length + "\n"
     ret = self.__comment
     if desc:
       ret += " " + desc + " "
-    for ii in range(len(ret), length):
-      ret += self.__comment
-    return block_text + ret + "\n" + block_text
+    return block_text + ret.ljust(length, self.__comment) + "\n" + block_text
 
   def format_comment(self, op, indent = ""):
     """Get comment string."""
-    ret = ""
-    if is_listing(op):
-      for ii in op:
-        if ii:
-          ret += indent + self.__comment + " " + ii + "\n"
+    prefix = indent + self.__comment + " "
+    if isinstance(op, (list, tuple)):
+      return "".join([prefix + ii + "\n" for ii in op if ii])
     elif op:
-      ret += indent + self.__comment + " " + op + "\n"
-    return ret
+      return prefix + op + "\n"
+    return ""
 
   def format_data(self, size, value, indent = ""):
     """Get data element."""
     size = int(size)
     if isinstance(value, int):
       value = hex(value)
-    elif is_listing(value):
-      value_strings = []
-      for ii in value:
-        if isinstance(ii, int):
-          value_strings += [hex(ii)]
-        else:
-          value_strings += [str(ii)]
-      value = ", ".join(value_strings)
+    elif isinstance(value, (list, tuple)):
+      value = ", ".join([hex(ii) if isinstance(ii, int) else str(ii) for ii in value])
     else:
       value = str(value)
       if value.startswith("\"") and 1 == size:
         return indent + self.__string + " " + value + "\n"
-    if 1 == size:
-      return indent + self.__byte + " " + value + "\n"
-    elif 2 == size:
-      return indent + self.__short + " " + value + "\n"
-    elif 4 == size:
-      return indent + self.__word + " " + value + "\n"
-    elif 8 == size:
-      return indent + self.__quad + " " + value + "\n"
-    else:
-      raise NotImplementedError("exporting assembler value of size %i", size)
+    if not size in self.__size_directives:
+      raise NotImplementedError("exporting assembler value of size %i" % (size))
+    return indent + self.__size_directives[size] + " " + value + "\n"
 
   def format_equ(self, name, value):
     return ".equ %s, %s\n" % (name, value)
@@ -225,13 +283,9 @@ class Assembler:
     """Generate name labels."""
     if not op:
       return ""
-    ret = ""
-    if is_listing(op):
-      for ii in op:
-        ret += ii + ":\n"
-    else:
-      ret += op + ":\n"
-    return ret
+    if isinstance(op, (list, tuple)):
+      return "".join([ii + ":\n" for ii in op])
+    return op + ":\n"
 
 ########################################
 # AssemblerFile ########################
@@ -243,19 +297,21 @@ class AssemblerFile:
   def __init__(self, filename):
     """Constructor, opens and reads a file."""
     fd = open(filename, "r")
-    lines = fd.readlines()
-    fd.close()
     self.__sections = []
     current_section = AssemblerSection("text")
-    ii = 0
-    sectionre = re.compile(r'^\s+\.section\s+\"?\.([a-zA-Z0-9_]+)[\.\s]')
-    for ii in lines:
-      match = sectionre.match(ii)
+    section_match = RE_SECTION.match
+    add_line = current_section.add_line
+    # Lines are streamed from the file, only the sections are kept in memory.
+    for ii in fd:
+      # Only a small minority of lines are section headers, substring test is cheaper than regex.
+      match = (".section" in ii) and section_match(ii)
       if match:
         self.add_sections(current_section)
         current_section = AssemblerSection(match.group(1), ii)
+        add_line = current_section.add_line
       else:
-        current_section.add_line(ii)
+        add_line(ii)
+    fd.close()
     if not current_section.empty():
       self.add_sections(current_section)
     if is_verbose():
@@ -265,37 +321,25 @@ class AssemblerFile:
   def add_sections(self, op):
     """Manually add one or more sections."""
     if(is_listing(op)):
-      self.__sections += op
+      self.__sections.extend(op)
     else:
-      self.__sections += [op]
+      self.__sections.append(op)
 
   def generate_fake_bss(self, assembler, und_symbols = None, elfling = None):
     """Remove local labels that would seem to generate .bss, make a fake .bss section."""
     bss = AssemblerSectionBss()
     for ii in self.__sections:
-      while True:
-        entry = ii.extract_bss(und_symbols)
-        if not entry:
-          break
-        if not entry.is_und_symbol():
-          bss.add_element(entry)
+      for jj in ii.extract_bss(und_symbols):
+        if not jj.is_und_symbol():
+          bss.add_element(jj)
     if elfling:
       bss.add_element(AssemblerBssElement(ELFLING_WORK, elfling.get_work_size()))
-    bss_size = bss.get_size()
-    if 0 < bss.get_alignment():
-      pt_load_string = ", second PT_LOAD required"
-    else:
-      pt_load_string = ", one PT_LOAD sufficient"
     if is_verbose():
-      outstr = "Constructed fake .bss segement: "
-      if 1073741824 < bss_size:
-        print("%s%1.1f Gbytes%s" % (outstr, float(bss_size) / 1073741824.0, pt_load_string))
-      elif 1048576 < bss_size:
-        print("%s%1.1f Mbytes%s" % (outstr, float(bss_size) / 1048576.0, pt_load_string))
-      elif 1024 < bss_size:
-        print("%s%1.1f kbytes%s" % (outstr, float(bss_size) / 1024.0, pt_load_string))
+      if 0 < bss.get_alignment():
+        pt_load_string = "second PT_LOAD required"
       else:
-        print("%s%u bytes%s" % (outstr, bss_size, pt_load_string))
+        pt_load_string = "one PT_LOAD sufficient"
+      print("Constructed fake .bss segement: %s, %s" % (format_size(bss.get_size()), pt_load_string))
     self.add_sections(bss)
     return bss
 
@@ -315,34 +359,36 @@ class AssemblerFile:
     """Remove .rodata sections by merging them into the previous .text section."""
     text_section = None
     rodata_sections = []
-    ii = 0
-    while len(self.__sections) > ii:
-      section = self.__sections[ii]
-      if "text" == section.get_name():
-        text_section = section
-        ii += 1
-      elif "rodata" == section.get_name():
+    sections = []
+    for ii in self.__sections:
+      if "text" == ii.get_name():
+        text_section = ii
+        sections.append(ii)
+      elif "rodata" == ii.get_name():
         if text_section:
-          text_section.merge_content(section)
+          text_section.merge_content(ii)
         else:
-          rodata_sections += [section]
-        del(self.__sections[ii])
+          rodata_sections.append(ii)
       else:
-        ii += 1
+        sections.append(ii)
+    self.__sections = sections
     # .rodata sections defined before any .text sections will be merged into
     # the last .text sextion.
     for ii in rodata_sections:
-      text_section.content += ii.content
+      text_section.merge_content(ii)
 
   def replace_constant(self, src, dst):
     """Replace constant with a replacement constant."""
     replace_count = 0
+    constantre = re.compile(r'(\$%s|\$%s)' % (src, hex(src)))
+    replacement = "$%s" % (hex(dst))
     for ii in self.__sections:
-      for jj in range(len(ii.content)):
-        line = ii.content[jj]
-        replaced = re.sub(r'(\$%s|\$%s)' % (src, hex(src)), r'$%s' % hex(dst), line)
+      content = ii.get_content()
+      for jj in range(len(content)):
+        line = content[jj]
+        replaced = constantre.sub(replacement, line)
         if line != replaced:
-          ii.content[jj] = replaced
+          content[jj] = replaced
           replace_count += 1
     if 1 > replace_count:
       raise RuntimeError("could not find constant to be replaced")
@@ -413,6 +459,8 @@ class AssemblerBssElement:
 class AssemblerSection:
   """Section in an existing assembler source file."""
 
+  __slots__ = ("__name", "__tag", "__content")
+
   def __init__(self, section_name, section_tag = None):
     """Constructor."""
     self.__name = section_name
@@ -421,7 +469,7 @@ class AssemblerSection:
 
   def add_line(self, line):
     """Add one line."""
-    self.__content += [line]
+    self.__content.append(line)
 
   def clear_content(self):
     """Clear all content."""
@@ -429,61 +477,24 @@ class AssemblerSection:
 
   def crunch(self):
     """Remove all offending content."""
-    while True:
-      lst = self.want_line(r'\s*\.file\s+(.*)')
-      if lst:
-        self.erase(lst[0])
-        continue
-      lst = self.want_line(r'\s*\.globl\s+(.*)')
-      if lst:
-        self.erase(lst[0])
-        continue
-      lst = self.want_line(r'\s*\.ident\s+(.*)')
-      if lst:
-        self.erase(lst[0])
-        continue
-      lst = self.want_line(r'\s*\.section\s+(.*)')
-      if lst:
-        self.erase(lst[0])
-        continue
-      lst = self.want_line(r'\s*\.type\s+(.*)')
-      if lst:
-        self.erase(lst[0])
-        continue
-      lst = self.want_line(r'\s*\.size\s+(.*)')
-      if lst:
-        self.erase(lst[0])
-        continue
-      lst = self.want_line(r'\s*\.(bss)\s+')
-      if lst:
-        self.erase(lst[0])
-        continue
-      lst = self.want_line(r'\s*\.(data)\s+')
-      if lst:
-        self.erase(lst[0])
-        continue
-      lst = self.want_line(r'\s*\.(text)\s+')
-      if lst:
-        self.erase(lst[0])
-        continue
-      break
+    self.__content = [ii for ii in self.__content if not RE_DIRECTIVE.match(ii)]
     if osarch_is_amd64():
-      self.crunch_amd64(lst)
+      self.crunch_amd64()
     elif osarch_is_ia32():
-      self.crunch_ia32(lst)
+      self.crunch_ia32()
     self.__tag = None
 
-  def crunch_amd64(self, lst):
+  def crunch_amd64(self):
     """Perform platform-dependent crunching."""
     self.crunch_entry_push("_start")
     self.crunch_entry_push(ELFLING_UNCOMPRESSED)
     self.crunch_jump_pop(ELFLING_UNCOMPRESSED)
-    lst = self.want_line(r'\s*(int\s+\$0x3|syscall)\s+.*')
+    lst = self.want_line(RE_FOOTER_AMD64)
     if lst:
       ii = lst[0] + 1
       jj = ii
       while True:
-        if len(self.__content) <= jj or re.match(r'\s*\S+\:\s*', self.__content[jj]):
+        if len(self.__content) <= jj or RE_LABEL.match(self.__content[jj]):
           if is_verbose():
             print("Erasing function footer after '%s': %i lines" % (lst[1], jj - ii))
           self.erase(ii, jj)
@@ -500,57 +511,61 @@ class AssemblerSection:
     stack_decrement = 0
     stack_save_decrement = 0
     reinstated_lines = []
+    content = self.__content
+    push_match = RE_PUSH.match
+    comment_match = RE_COMMENT.match
+    mov_match = RE_MOV.match
+    xor_match = RE_XOR.match
+    sub_sp_match = RE_SUB_SP.match
     while True:
-      current_line = self.__content[jj]
-      match = re.match(r'\s*(push\S).*%(\S+)', current_line, re.IGNORECASE)
+      current_line = content[jj]
+      match = push_match(current_line)
       if match:
         if is_stack_save_register(match.group(2)):
           stack_save_decrement += get_push_size(match.group(1))
         else:
           stack_decrement += get_push_size(match.group(1))
         jj += 1
-        continue;
+        continue
       # Preserve comment lines as they are.
-      match = re.match(r'^\s*[#;].*', current_line, re.IGNORECASE)
-      if match:
-        reinstated_lines += [current_line]
+      if comment_match(current_line):
+        reinstated_lines.append(current_line)
         jj += 1
         continue
       # Saving stack pointer or sometimes initializing edx seem to be within pushing.
-      match = re.match(r'\s*mov.*,\s*%(rbp|ebp|edx).*', current_line, re.IGNORECASE)
+      match = mov_match(current_line)
       if match:
         if is_stack_save_register(match.group(1)):
           stack_save_decrement = 0
-        reinstated_lines += [current_line]
+        reinstated_lines.append(current_line)
         jj += 1
-        continue;
+        continue
       # xor (zeroing) seems to be inserted in the 'middle' of pushing.
-      match = re.match(r'\s*xor.*\s+%(\S+)\s?,.*', current_line, re.IGNORECASE)
-      if match:
-        reinstated_lines += [current_line]
+      if xor_match(current_line):
+        reinstated_lines.append(current_line)
         jj += 1
         continue
-      match = re.match(r'\s*sub.*\s+[^\d]*(\d+),\s*%(rsp|esp)', current_line, re.IGNORECASE)
+      match = sub_sp_match(current_line)
       if match:
         total_decrement = int(match.group(1)) + stack_decrement + stack_save_decrement
-        self.__content[jj] = re.sub(r'\d+', str(total_decrement), current_line)
+        content[jj] = RE_INTEGER.sub(str(total_decrement), current_line)
       break
     if is_verbose():
       print("Erasing function header from '%s': %i lines" % (op, jj - ii - len(reinstated_lines)))
     self.erase(ii, jj)
     self.__content[ii:ii] = reinstated_lines
 
-  def crunch_ia32(self, lst):
+  def crunch_ia32(self):
     """Perform platform-dependent crunching."""
     self.crunch_entry_push("_start")
     self.crunch_entry_push(ELFLING_UNCOMPRESSED)
     self.crunch_jump_pop(ELFLING_UNCOMPRESSED)
-    lst = self.want_line(r'\s*int\s+\$(0x3|0x80)\s+.*')
+    lst = self.want_line(RE_FOOTER_IA32)
     if lst:
       ii = lst[0] + 1
       jj = ii
       while True:
-        if len(self.__content) <= jj or re.match(r'\s*\S+\:\s*', self.__content[jj]):
+        if len(self.__content) <= jj or RE_LABEL.match(self.__content[jj]):
           if is_verbose():
             print("Erasing function footer after interrupt '%s': %i lines." % (lst[1], jj - ii))
           self.erase(ii, jj)
@@ -559,13 +574,13 @@ class AssemblerSection:
 
   def crunch_jump_pop(self, op):
     """Crunch popping before a jump."""
-    lst = self.want_line(r'\s*(jmp\s+%s)\s+.*' % (op))
+    lst = self.want_line(re.compile(r'\s*(jmp\s+%s)\s+.*' % (op), re.IGNORECASE))
     if not lst:
       return
     ii = lst[0]
     jj = ii - 1
     while True:
-      if (0 > jj) or not re.match(r'\s*(pop\S).*', self.__content[jj], re.IGNORECASE):
+      if (0 > jj) or not RE_POP.match(self.__content[jj]):
         if is_verbose():
           print("Erasing function footer before jump to '%s': %i lines" % (op, ii - jj - 1))
         self.erase(jj + 1, ii)
@@ -587,92 +602,106 @@ class AssemblerSection:
     self.__content[first:last] = []
 
   def extract_bss(self, und_symbols):
-    """Extract a variable that should go to .bss section."""
-    # Test for relevant .globl element.
-    found = self.extract_globl_object()
-    if found:
-      return AssemblerBssElement(found[0], found[1], und_symbols)
-    found = self.extract_comm_object()
-    if found:
-      return AssemblerBssElement(found[0], found[1], und_symbols)
+    """Extract all variables that should go to .bss section, crunch the rest."""
+    ret = []
+    # Erasing extracted lines never makes an earlier candidate valid, so search may resume from last hit.
+    content_text = "".join(self.__content)
+    if ".globl" in content_text:
+      idx = 0
+      while True:
+        found = self.extract_globl_object(idx)
+        if not found:
+          break
+        ret.append(AssemblerBssElement(found[0], found[1], und_symbols))
+        idx = found[2]
+    if ".local" in content_text:
+      idx = 0
+      while True:
+        found = self.extract_comm_object(idx)
+        if not found:
+          break
+        ret.append(AssemblerBssElement(found[0], found[1], und_symbols))
+        idx = found[2]
     self.minimal_align()
     self.crunch()
-    return None
+    return ret
 
-  def extract_comm_object(self):
+  def extract_comm_object(self, idx = 0):
     """.comm extract."""
-    idx = 0
     while True:
-      lst = self.want_line(r'\s*\.local\s+(\S+).*', idx)
+      lst = self.want_line(RE_LOCAL, idx)
       if lst:
         attempt = lst[0]
         name = lst[1]
         idx = attempt + 1
-        lst = self.want_line(r'\s*\.comm\s+%s\s*,(.*)' % (name), idx)
+        lst = self.want_named_line(RE_COMM, name, idx)
         if not lst:
           continue
         size = lst[1]
-        match = re.match(r'\s*(\d+)\s*,\s*(\d+).*', size)
+        match = RE_COMM_SIZE.match(size)
         if match:
           size = int(match.group(1))
         else:
           size = int(size)
         self.erase(attempt, lst[0] + 1)
-        return (name, size)
+        return (name, size, attempt)
       return None
 
-  def extract_globl_object(self):
+  def extract_globl_object(self, idx = 0):
     """.globl extract."""
-    idx = 0
     while True:
-      lst = self.want_line(r'\s*\.globl\s+(\S+).*', idx)
+      lst = self.want_line(RE_GLOBL, idx)
       if lst:
         attempt = lst[0]
         name = lst[1]
         idx = attempt + 1
-        lst = self.want_line("\s*.type\s+(%s),\s+@object" % (name), idx)
+        lst = self.want_named_line(RE_TYPE_OBJECT, name, idx)
         if not lst:
           continue
-        lst = self.want_line("\s*(%s)\:" % (name), lst[0] + 1)
+        lst = self.want_named_line(RE_LABEL_NAME, name, lst[0] + 1)
         if not lst:
           continue
-        lst = self.want_line("\s*\.zero\s+(\d+)", lst[0] + 1)
+        lst = self.want_line(RE_ZERO, lst[0] + 1)
         if not lst:
           continue
         self.erase(attempt, lst[0] + 1)
-        return (name, int(lst[1]))
+        return (name, int(lst[1]), attempt)
       return None
 
   def gather_labels(self):
     """Gathers all labels."""
     ret = []
     for ii in self.__content:
-      match = re.match(r'((\.L|_ZL)[^:,\s\(]+)', ii)
+      match = RE_LABEL_LOCAL.match(ii)
       if match:
-        ret += [match.group(1)]
-      match = re.match(r'^([^\.:,\s\(]+):', ii)
+        ret.append(match.group(1))
+      match = RE_LABEL_GLOBAL.match(ii)
       if match:
-        ret += [match.group(1)]
+        ret.append(match.group(1))
     return ret
 
+  def get_content(self):
+    """Accessor."""
+    return self.__content
+
   def get_name(self):
     """Accessor."""
     return self.__name
 
   def merge_content(self, other):
     """Merge content with another section."""
-    self.__content += other.__content
+    self.__content.extend(other.__content)
 
   def minimal_align(self):
     """Remove all .align declarations, replace with desired alignment."""
     desired = int(PlatformVar("align"))
-    for ii in range(len(self.__content)):
-      line = self.__content[ii]
-      match = re.match(r'.*\.align\s+(\d+).*', line)
+    for (ii, line) in enumerate(self.__content):
+      # Substring test rejects most lines before the regex is run.
+      match = (".align" in line) and RE_ALIGN.search(line)
       if match:
         align = int(match.group(1))
         # Due to GNU AS compatibility modes, .align may mean different things.
-        if osarch_is_amd64 or osarch_is_ia32():
+        if osarch_is_amd64() or osarch_is_ia32():
           if desired != align:
             if is_verbose():
               print("Replacing %i-byte alignment with %i-byte alignment." % (align, desired))
@@ -697,28 +726,39 @@ class AssemblerSection:
           self.__content[ii] = dst
           break
 
+  def set_content(self, lst):
+    """Replace all content with given lines."""
+    self.__content = lst
+
   def want_entry_point(self):
     """Want a line matching the entry point function."""
-    return self.want_label("_start")
+    return self.want_line(RE_START)
 
   def want_label(self, op):
     """Want a label from code."""
-    return self.want_line(r'\s*\S*(%s)\S*\:.*' % (op))
+    return self.want_line(re.compile(r'\s*\S*(%s)\S*\:.*' % (op), re.IGNORECASE))
 
   def want_line(self, op, first = 0):
-    """Want a line matching regex from object."""
+    """Want a line matching compiled regex from object."""
     for ii in range(first, len(self.__content)):
-      match = re.match(op, self.__content[ii], re.IGNORECASE)
+      match = op.match(self.__content[ii])
       if match:
         return (ii, match.group(1))
     return None
 
+  def want_named_line(self, op, name, first = 0):
+    """Want a line matching compiled regex with first group equal to given name from object."""
+    for ii in range(first, len(self.__content)):
+      match = op.match(self.__content[ii])
+      if match and (match.group(1) == name):
+        return (ii, match.group(op.groups))
+    return None
+
   def write(self, fd):
     """Write this section into a file."""
     if self.__tag:
       fd.write(self.__tag)
-    for ii in self.__content:
-      fd.write(ii)
+    fd.writelines(self.__content)
 
 ########################################
 # AssemblerSectionAlignment ############
@@ -763,30 +803,31 @@ class AssemblerSectionBss(AssemblerSection):
   def add_element(self, op):
     """Add one variable element."""
     if op in self.__elements:
-      print("WARNING: trying to add .bss element twice: %s" % (str(element)))
+      print("WARNING: trying to add .bss element twice: %s" % (str(op)))
       return
-    self.__elements += [op]
-    self.__elements.sort()
+    bisect.insort(self.__elements, op)
     self.__size += op.get_size()
     if op.is_und_symbol():
       self.__und_size += op.get_size()
 
   def create_content(self, assembler, prepend_label = None):
     """Generate assembler content."""
-    self.clear_content()
+    lines = []
     if prepend_label:
-      self.add_line(assembler.format_label(prepend_label))
+      lines.append(assembler.format_label(prepend_label))
     if 0 < self.__size:
-      self.add_line(assembler.format_align(int(PlatformVar("addr"))))
-      self.add_line(assembler.format_label("aligned_end"))
+      lines.append(assembler.format_align(int(PlatformVar("addr"))))
+      lines.append(assembler.format_label("aligned_end"))
     if 0 < self.get_alignment():
-      self.add_line(assembler.format_align(self.get_alignment()))
-    self.add_line(assembler.format_label("bss_start"))
+      lines.append(assembler.format_align(self.get_alignment()))
+    lines.append(assembler.format_label("bss_start"))
+    format_equ = assembler.format_equ
     cumulative = 0
     for ii in self.__elements:
-      self.add_line(assembler.format_equ(ii.get_name(), "bss_start + %i" % (cumulative)))
+      lines.append(format_equ(ii.get_name(), "bss_start + %i" % (cumulative)))
       cumulative += ii.get_size()
-    self.add_line(assembler.format_equ("bss_end", "bss_start + %i" % (cumulative)))
+    lines.append(format_equ("bss_end", "bss_start + %i" % (cumulative)))
+    self.set_content(lines)
 
   def get_alignment(self):
     """Get alignment. May be zero."""
@@ -806,9 +847,11 @@ class AssemblerSectionBss(AssemblerSection):
 class AssemblerVariable:
   """One assembler variable."""
 
+  __slots__ = ("__desc", "__size", "__value", "__name", "__original_size", "__label_pre", "__label_post")
+
   def __init__(self, op, name = None):
     """Constructor."""
-    if not is_listing(op):
+    if not isinstance(op, (list, tuple)):
       raise RuntimeError("only argument passed is not a list")
     self.__desc = op[0]
     self.__size = op[1]
@@ -822,39 +865,36 @@ class AssemblerVariable:
 
   def add_label_pre(self, op):
     """Add pre-label(s)."""
-    if is_listing(op):
-      self.__label_pre += op
+    if isinstance(op, (list, tuple)):
+      self.__label_pre.extend(op)
     else:
-      self.__label_pre += [op]
+      self.__label_pre.append(op)
 
   def add_label_post(self, op):
     """Add post-label(s)."""
-    if is_listing(op):
-      self.__label_post += op
+    if isinstance(op, (list, tuple)):
+      self.__label_post.extend(op)
     else:
-      self.__label_post += [op]
+      self.__label_post.append(op)
 
   def deconstruct(self):
     """Deconstruct into byte stream."""
-    lst = []
-    if is_listing(self.__value):
+    # Iterating a bytearray yields integers on all Python versions.
+    lst = bytearray()
+    if isinstance(self.__value, (list, tuple)):
       for ii in self.__value:
         if not is_deconstructable(ii):
           break
         lst += self.deconstruct_single(int(ii))
     elif is_deconstructable(self.__value):
-      lst = self.deconstruct_single(int(self.__value))
+      lst += self.deconstruct_single(int(self.__value))
     if 0 >= len(lst):
       return None
     if 1 >= len(lst):
       return [self]
     ret = []
-    for ii in range(len(lst)):
-      struct_elem = lst[ii]
-      if isinstance(struct_elem, str):
-        var = AssemblerVariable(("", 1, ord(struct_elem)))
-      else:
-        var = AssemblerVariable(("", 1, int(struct_elem)))
+    for (ii, struct_elem) in enumerate(lst):
+      var = AssemblerVariable(("", 1, struct_elem))
       if 0 == ii:
         var.__desc = self.__desc
         var.__name = self.__name
@@ -862,61 +902,44 @@ class AssemblerVariable:
         var.__label_pre = self.__label_pre
       elif len(lst) - 1 == ii:
         var.__label_post = self.__label_post
-      ret += [var]
+      ret.append(var)
     return ret
 
   def deconstruct_single(self, op):
     """Desconstruct a single value."""
-    bom = str(PlatformVar("bom"))
     int_size = int(self.__size)
-    if 1 == int_size:
-      return struct.pack(bom + "B", op)
-    if 2 == int_size:
-      if 0 > op:
-        return struct.pack(bom + "h", op)
-      else:
-        return struct.pack(bom + "H", op)
-    elif 4 == int_size:
-      if 0 > op:
-        return struct.pack(bom + "i", op)
-      else:
-        return struct.pack(bom + "I", op)
-    elif 8 == int_size:
-      if 0 > op:
-        return struct.pack(bom + "q", op)
-      else:
-        return struct.pack(bom + "Q", op)
-    raise RuntimeError("cannot pack value of size %i" % (int_size))
+    packer = g_struct_packers.get((str(PlatformVar("bom")), int_size, 0 > op))
+    if not packer:
+      raise RuntimeError("cannot pack value of size %i" % (int_size))
+    return packer.pack(op)
 
   def generate_source(self, assembler, indent, label = None):
     """Generate assembler source."""
-    ret = ""
+    ret = []
     indent = get_indent(indent)
     for ii in self.__label_pre:
-      ret += assembler.format_label(ii)
+      ret.append(assembler.format_label(ii))
     if isinstance(self.__value, str) and self.__value.startswith("\"") and label and self.__name:
-      ret += assembler.format_label("%s_%s" % (label, self.__name))
+      ret.append(assembler.format_label("%s_%s" % (label, self.__name)))
     formatted_comment = assembler.format_comment(self.__desc, indent)
     formatted_data = assembler.format_data(self.__size, self.__value, indent)
     if formatted_comment:
-      ret += formatted_comment
-    ret += formatted_data
+      ret.append(formatted_comment)
+    ret.append(formatted_data)
     for ii in self.__label_post:
-      ret += assembler.format_label(ii)
-    return ret
+      ret.append(assembler.format_label(ii))
+    return "".join(ret)
+
+  def get_byte(self):
+    """Get value of a deconstructed single-byte variable."""
+    if isinstance(self.__value, (list, tuple)):
+      return int(self.__value[0]) & 0xFF
+    return int(self.__value) & 0xFF
 
   def get_size(self):
     """Accessor."""
     return self.__size
 
-  def mergable(self, op):
-    """Tell if the two assembler variables are mergable."""
-    if int(self.__size) != int(op.__size):
-      return False
-    if self.__value != op.__value:
-      return False
-    return True
-
   def merge(self, op):
     """Merge two assembler variables into one."""
     self.__desc = listify(self.__desc, op.__desc)
@@ -924,28 +947,22 @@ class AssemblerVariable:
     self.__label_pre = listify(self.__label_pre, op.__label_pre)
     self.__label_post = listify(self.__label_post, op.__label_post)
 
-  def reconstruct(self, lst):
-    """Reconstruct variable from a listing."""
+  def reconstruct(self, lst, first = 0):
+    """Reconstruct variable from a listing, starting from given index."""
     original_size = int(self.__original_size)
     self.__original_size = -1
     if 1 >= original_size:
       return False
-    if len(lst) < original_size - 1:
+    if len(lst) - first < original_size - 1:
       return False
-    ret = chr(self.__value)
+    ret = bytearray([self.__value])
     for ii in range(original_size - 1):
-      op = lst[ii]
+      op = lst[first + ii]
       if not op.reconstructable((original_size - 2) == ii):
         return False
-      self.__label_post = listify(self.__label_post, op.label_post)
-      ret += chr(op.value)
-    bom = str(PlatformVar("bom"))
-    if 2 == original_size:
-      self.__value = struct.unpack(bom + "H", ret)[0]
-    elif 4 == original_size:
-      self.__value = struct.unpack(bom + "I", ret)[0]
-    elif 8 == original_size:
-      self.__value = struct.unpack(bom + "Q", ret)[0]
+      self.__label_post = listify(self.__label_post, op.__label_post)
+      ret.append(op.__value)
+    self.__value = g_struct_packers[(str(PlatformVar("bom")), original_size, False)].unpack(bytes(ret))[0]
     self.__size = original_size
     return original_size - 1
 
@@ -961,6 +978,7 @@ class AssemblerVariable:
       return False
     if -1 != self.__original_size:
       return False
+    return True
 
   def remove_label_pre(self, op):
     """Remove a pre-label."""
@@ -999,6 +1017,8 @@ class AssemblerVariable:
 class AssemblerSegment:
   """Segment is a collection of variables."""
 
+  __slots__ = ("__name", "__desc", "__data")
+
   def __init__(self, op):
     """Constructor."""
     self.__name = None
@@ -1007,10 +1027,10 @@ class AssemblerSegment:
     if isinstance(op, str):
       self.__name = op
       self.__desc = None
-    elif is_listing(op):
+    elif isinstance(op, (list, tuple)):
       for ii in op:
-        if is_listing(ii):
-          self.add_data(ii)
+        if isinstance(ii, (list, tuple)):
+          self.__data.append(AssemblerVariable(ii))
         elif not self.__name:
           self.__name = ii
         elif not self.__desc:
@@ -1022,9 +1042,13 @@ class AssemblerSegment:
 
   def add_data(self, op):
     """Add data into this segment."""
-    self.__data += [AssemblerVariable(op)]
-    self.refresh_name_label()
-    self.refresh_name_end_label()
+    self.__data.append(AssemblerVariable(op))
+    # Only the first variable carries the name label and only the last one carries the end label.
+    if 1 >= len(self.__data):
+      self.refresh_name_label()
+    else:
+      self.__data[-2].remove_label_post("%s_end" % (self.__name))
+    self.__data[-1].add_label_post("%s_end" % (self.__name))
 
   def add_dt_hash(self, op):
     """Add hash dynamic structure."""
@@ -1126,24 +1150,19 @@ class AssemblerSegment:
 
   def generate_source(self, op):
     """Generate assembler source."""
-    ret = op.format_block_comment(self.__desc)
+    ret = [op.format_block_comment(self.__desc)]
     for ii in self.__data:
-      ret += ii.generate_source(op, 1, self.__name)
-    return ret
+      ret.append(ii.generate_source(op, 1, self.__name))
+    return "".join(ret)
 
   def merge(self, op):
     """Attempt to merge with given segment."""
-    highest_mergable = 0
     (head_src, bytestream_src) = self.deconstruct_tail()
     (bytestream_dst, tail_dst) = op.deconstruct_head()
-    for ii in range(min(len(bytestream_src), len(bytestream_dst))):
-      mergable = True
-      for jj in range(ii + 1):
-        if not bytestream_src[-ii - 1 + jj].mergable(bytestream_dst[jj]):
-          mergable = False
-          break
-      if mergable:
-        highest_mergable = ii + 1
+    # Compare deconstructed streams as raw bytes, variables are only needed for labels.
+    bytes_src = bytearray([ii.get_byte() for ii in bytestream_src])
+    bytes_dst = bytearray([ii.get_byte() for ii in bytestream_dst])
+    highest_mergable = get_longest_overlap(bytes_src, bytes_dst)
     if 0 >= highest_mergable:
       return False
     if is_verbose():
@@ -1158,13 +1177,15 @@ class AssemblerSegment:
   def reconstruct(self, bytestream):
     """Reconstruct data from bytestream."""
     self.__data = []
-    while 0 < len(bytestream):
-      front = bytestream[0]
-      bytestream = bytestream[1:]
-      constructed = front.reconstruct(bytestream)
+    # Walk the stream by index instead of slicing off the front on every step.
+    ii = 0
+    while ii < len(bytestream):
+      front = bytestream[ii]
+      ii += 1
+      constructed = front.reconstruct(bytestream, ii)
       if constructed:
-        bytestream[:constructed] = []
-      self.__data += [front]
+        ii += constructed
+      self.__data.append(front)
 
   def refresh_name_label(self):
     """Add name label to first assembler variable."""
@@ -1395,23 +1416,21 @@ class Linker:
     """Constructor."""
     self.__command = op
     self.__command_basename = os.path.basename(self.__command)
+    self.__command_family = get_command_family(self.__command_basename)
     self.__library_directories = []
+    self.__library_name_cache = {}
     self.__libraries = []
     self.__linker_flags = []
     self.__linker_script = []
 
-  def command_basename_startswith(self, op):
-    """Check if command basename starts with given string."""
-    return self.__command_basename.startswith(op)
-
   def generate_linker_flags(self):
     """Generate linker command for given mode."""
     self.__linker_flags = []
-    if self.__command_basename.startswith("g++") or self.__command_basename.startswith("gcc"):
-      self.__linker_flags += ["-nostartfiles", "-nostdlib", "-Xlinker", "--strip-all"]
-    elif self.__command_basename.startswith("clang"):
-      self.__linker_flags += ["-nostdlib", "-Xlinker", "--strip-all"]
-    elif self.__command_basename.startswith("ld"):
+    if "gcc" == self.__command_family:
+      self.__linker_flags += LINKER_FLAGS_GCC
+    elif "clang" == self.__command_family:
+      self.__linker_flags += LINKER_FLAGS_CLANG
+    elif "ld" == self.__command_family:
       dynamic_linker = str(PlatformVar("interp"))
       if dynamic_linker.startswith("\"") and dynamic_linker.endswith("\""):
         dynamic_linker = dynamic_linker[1:-1]
@@ -1419,31 +1438,34 @@ class Linker:
         dynamic_linker = ""
       self.__linker_flags += ["-nostdlib", "--strip-all", "--dynamic-linker=%s" % (dynamic_linker)]
     else:
-      raise RuntimeError("compilation not supported with compiler '%s'" % (op))
+      raise RuntimeError("compilation not supported with compiler '%s'" % (self.__command_basename))
 
   def get_command(self):
     """Accessor."""
     return self.__command
 
+  def get_command_basename(self):
+    """Accessor."""
+    return self.__command_basename
+
+  def get_command_family(self):
+    """Accessor."""
+    return self.__command_family
+
   def get_library_list(self):
     """Generate link library list libraries."""
-    ret = []
     prefix = "-l"
-    if self.__command_basename.startswith("cl."):
+    if "cl" == self.__command_family:
       prefix = "/l"
-    for ii in self.__libraries:
-      ret += [prefix + ii]
-    return ret
+    return [prefix + ii for ii in self.__libraries]
 
   def get_library_directory_list(self):
     """Set link directory listing."""
-    ret = []
     prefix = "-L"
-    if self.__command_basename.startswith("cl."):
+    if "cl" == self.__command_family:
       prefix = "/L"
-    for ii in self.__library_directories:
-      ret += [prefix + ii]
-    if self.__command_basename.startswith("ld"):
+    ret = [prefix + ii for ii in self.__library_directories]
+    if "ld" == self.__command_family:
       ret += ["-rpath-link", ":".join(self.__library_directories)]
     return ret
 
@@ -1452,22 +1474,14 @@ class Linker:
     if op.startswith("/"):
       return op
     # Check if the library is specified verbatim. If yes, no need to expand.
-    if re.match(r'lib.+\.so(\..*)?', op):
+    if RE_LIBRARY_VERBATIM.match(op):
       return op
-    libname = "lib%s.so" % (op)
-    # Shared object may be linker script, if so, it will tell actual shared object.
-    for ii in self.__library_directories:
-      current_libname = locate(ii, libname)
-      if current_libname and file_is_ascii_text(current_libname):
-        fd = open(current_libname, "r")
-        match = re.search(r'GROUP\s*\(\s*(\S+)\s+', fd.read(), re.MULTILINE)
-        fd.close()
-        if match:
-          ret = os.path.basename(match.group(1))
-          if is_verbose():
-            print("Using shared library '%s' instead of '%s'." % (ret, libname))
-          return ret
-    return libname
+    # Resolving requires traversing library directories, only do it once per library.
+    if op in self.__library_name_cache:
+      return self.__library_name_cache[op]
+    ret = self.resolve_library_name("lib%s.so" % (op))
+    self.__library_name_cache[op] = ret
+    return ret
 
   def get_linker_flags(self):
     """Accessor."""
@@ -1478,14 +1492,17 @@ class Linker:
     (so, se) = run_command([self.__command, "--verbose"])
     if 0 < len(se) and is_verbose():
       print(se)
-    match = re.match(r'.*linker script\S+\s*\n=+\s+(.*)\s+=+\s*\n.*', so, re.DOTALL)
+    match = RE_LINKER_SCRIPT.match(so)
     if not match:
       raise RuntimeError("could not extract script from linker output")
-    ld_script = match.group(1)
-    ld_script = re.sub(r'\n([^\n]+\s)(_end|_edata|__bss_start)(\s*=[^\n]+)\n', r'\n\1/*\2\3*/\n', ld_script, re.MULTILINE)
-    ld_script = re.sub(r'SEGMENT_START\s*\(\s*(\S+)\s*,\s*\d*x?\d+\s*\)', r'SEGMENT_START(\1, %s)' % (str(PlatformVar("entry"))), ld_script, re.MULTILINE)
+    entry = str(PlatformVar("entry"))
+    def rewrite(match):
+      if match.group(1):
+        return "\n%s/*%s%s*/\n" % (match.group(1), match.group(2), match.group(3))
+      return "SEGMENT_START(%s, %s)" % (match.group(4), entry)
+    ld_script = RE_LINKER_SCRIPT_REWRITE.sub(rewrite, match.group(1))
     if modify_start:
-      ld_script = re.sub(r'(SEGMENT_START.*\S)\s*\+\s*SIZEOF_HEADERS\s*;', r'\1;', ld_script, re.MULTILINE)
+      ld_script = RE_LINKER_SCRIPT_START.sub(r'\1;', ld_script)
     fd = open(dst, "w")
     fd.write(ld_script)
     fd.close()
@@ -1513,11 +1530,25 @@ class Linker:
     """Set libraries to link."""
     self.__libraries = lst
 
+  def resolve_library_name(self, libname):
+    """Resolve library name by searching library directories for linker scripts."""
+    # Shared object may be linker script, if so, it will tell actual shared object.
+    for ii in self.__library_directories:
+      current_libname = locate(ii, libname)
+      if current_libname and file_is_ascii_text(current_libname):
+        fd = open(current_libname, "r")
+        match = RE_GROUP.search(fd.read())
+        fd.close()
+        if match:
+          ret = os.path.basename(match.group(1))
+          if is_verbose():
+            print("Using shared library '%s' instead of '%s'." % (ret, libname))
+          return ret
+    return libname
+
   def set_library_directories(self, lst):
-    self.__library_directories = []
-    for ii in lst:
-      if os.path.isdir(ii):
-        self.__library_directories += [ii]
+    self.__library_directories = [ii for ii in lst if os.path.isdir(ii)]
+    self.__library_name_cache = {}
 
   def set_linker_script(self, op):
     """Use given linker script."""
@@ -1544,7 +1575,7 @@ class Compiler(Linker):
       for ii in op:
         self.add_extra_compiler_flags(ii)
     elif not op in self.__include_directories and not op in self.__definitions:
-      self.__compiler_flags_extra += [op]
+      self.__compiler_flags_extra.append(op)
 
   def compile_asm(self, src, dst):
     """Compile a file into assembler source."""
@@ -1563,24 +1594,31 @@ class Compiler(Linker):
   def generate_compiler_flags(self):
     """Generate compiler flags."""
     self.__compiler_flags = []
-    if self.command_basename_startswith("g++") or self.command_basename_startswith("gcc"):
-      self.__compiler_flags += ["-Os", "-ffast-math", "-fno-asynchronous-unwind-tables", "-fno-exceptions", "-fno-rtti", "-fno-threadsafe-statics", "-fomit-frame-pointer", "-fsingle-precision-constant", "-fwhole-program", "-march=%s" % (str(PlatformVar("march"))), "-Wall"]
+    march = "-march=%s" % (str(PlatformVar("march")))
+    if "gcc" == self.get_command_family():
+      self.__compiler_flags += COMPILER_FLAGS_GCC
+      self.__compiler_flags += [march, "-Wall"]
       # Some flags are platform-specific.
       stack_boundary = int(PlatformVar("mpreferred-stack-boundary"))
       if 0 < stack_boundary:
         self.__compiler_flags += ["-mpreferred-stack-boundary=%i" % (stack_boundary)]
-    elif self.command_basename_startswith("clang"):
-      self.__compiler_flags += ["-Os", "-ffast-math", "-fno-asynchronous-unwind-tables", "-fno-exceptions", "-fno-rtti", "-fno-threadsafe-statics", "-fomit-frame-pointer", "-march=%s" % (str(PlatformVar("march"))), "-Wall"]
+    elif "clang" == self.get_command_family():
+      self.__compiler_flags += COMPILER_FLAGS_CLANG
+      self.__compiler_flags += [march, "-Wall"]
     else:
       raise RuntimeError("compilation not supported with compiler '%s'" % (self.get_command_basename()))
 
   def preprocess(self, op):
-    """Preprocess a file, return output."""
-    args = [self.get_command(), op] + self.__compiler_flags_extra + self.__definitions + self.__include_directories
-    if self.command_basename_startswith("cl."):
-      args += ["/E"]
+    """Preprocess a file or a listing of files in one invocation, return combined output."""
+    if is_listing(op):
+      args = [self.get_command()] + list(op)
     else:
-      args += ["-E"]
+      args = [self.get_command(), op]
+    args += self.__compiler_flags_extra + self.__definitions + self.__include_directories
+    if "cl" == self.get_command_family():
+      args.append("/E")
+    else:
+      args.append("-E")
     (so, se) = run_command(args)
     if 0 < len(se) and is_verbose():
       print(se)
@@ -1590,19 +1628,18 @@ class Compiler(Linker):
     """Set definitions."""
     prefix = "-D"
     self.__definitions = []
-    if self.command_basename_startswith("cl."):
+    if "cl" == self.get_command_family():
       prefix = "/D"
-      self.__definitions += [prefix + "WIN32"]
+      self.__definitions.append(prefix + "WIN32")
     if isinstance(lst, (list, tuple)):
-      for ii in lst:
-        self.__definitions += [prefix + ii]
+      self.__definitions += [prefix + ii for ii in lst]
     else:
-      self.__definitions += [prefix + lst]
+      self.__definitions.append(prefix + lst)
 
   def set_include_dirs(self, lst):
     """Set include directory listing."""
     prefix = "-I"
-    if self.command_basename_startswith("cl."):
+    if "cl" == self.get_command_family():
       prefix = "/I"
     self.__include_directories = []
     for ii in lst:
@@ -1610,7 +1647,7 @@ class Compiler(Linker):
         new_include_directory = prefix + ii
         if new_include_directory in self.__compiler_flags_extra:
           self.__compiler_flags_extra.remove(new_include_directory)
-        self.__include_directories += [new_include_directory]
+        self.__include_directories.append(new_include_directory)
 
 ########################################
 # Elfling ##############################
@@ -1779,9 +1816,11 @@ class Elfling:
 def sdbm_hash(name):
   """Calculate SDBM hash over a string."""
   ret = 0
-  for ii in name:
-    ret = (ret * 65599 + ord(ii)) & 0xFFFFFFFF
-  return hex(ret)
+  # Hash the encoded bytes, as done by the loader. Iterating a bytearray yields integers directly.
+  for ii in bytearray(name.encode()):
+    ret = ret * 65599 + ii
+  # Truncating once at the end equals 32-bit wraparound at every step.
+  return hex(int(ret & 0xFFFFFFFF))
 
 class Symbol:
   """Represents one (function) symbol."""
@@ -1795,7 +1834,7 @@ class Symbol:
     else:
       self.__name = lst[1]
       self.__rename = lst[1]
-    self.__hash = sdbm_hash(self.__name)
+    self.__hash = None
     self.__parameters = None
     if 2 < len(lst):
       self.__parameters = lst[2:]
@@ -1803,23 +1842,11 @@ class Symbol:
 
   def generate_definition(self):
     """Get function definition for given symbol."""
-    apientry = ""
-    if self.__name[:2] == "gl":
-      apientry = "DNLOAD_APIENTRY "
-    params = "void"
-    if self.__parameters:
-      params = ", ".join(self.__parameters)
-    return "%s (%s*%s)(%s)" % (self.__returntype, apientry, self.__name, params)
+    return "%s (%s*%s)(%s)" % (self.__returntype, self.get_apientry(), self.__name, self.get_parameter_string())
 
   def generate_prototype(self):
     """Get function prototype for given symbol."""
-    apientry = ""
-    if self.__name[:2] == "gl":
-      apientry = "DNLOAD_APIENTRY "
-    params = "void"
-    if self.__parameters:
-      params = ", ".join(self.__parameters)
-    return "(%s (%s*)(%s))" % (self.__returntype, apientry, params)
+    return "(%s (%s*)(%s))" % (self.__returntype, self.get_apientry(), self.get_parameter_string())
 
   def generate_rename_direct(self, prefix):
     """Generate definition to use without a symbol table."""
@@ -1829,8 +1856,17 @@ class Symbol:
     """Generate definition to use with a symbol table."""
     return "#define %s%s g_symbol_table.%s" % (prefix, self.__name, self.__name)
 
+  def get_apientry(self):
+    """Get calling convention prefix for given symbol."""
+    if self.__name.startswith("gl"):
+      return "DNLOAD_APIENTRY "
+    return ""
+
   def get_hash(self):
     """Get the hash of symbol name."""
+    # Only symbols actually in use need hashing, calculate on first request.
+    if self.__hash is None:
+      self.__hash = sdbm_hash(self.__name)
     return self.__hash
 
   def get_library(self):
@@ -1845,13 +1881,11 @@ class Symbol:
     """Accessor."""
     return self.__name
 
-  def __lt__(self, rhs):
-    """Sorting operator."""
-    if self.__library.get_name() < rhs.__library.get_name():
-      return True
-    elif self.__library.get_name() > rhs.__library.get_name():
-      return False
-    return self.__name < rhs.__name
+  def get_parameter_string(self):
+    """Get comma-separated parameter listing for given symbol."""
+    if self.__parameters:
+      return ", ".join(self.__parameters)
+    return "void"
 
   def __str__(self):
     """String representation."""
@@ -1868,24 +1902,38 @@ class LibraryDefinition:
     """Constructor."""
     self.__name = name
     self.__symbols = []
+    self.__symbols_by_name = {}
     self.add_symbols(symbols)
 
   def add_symbols(self, lst):
     """Add a symbol listing."""
     for ii in lst:
-      self.__symbols += [Symbol(ii, self)]
+      symbol = Symbol(ii, self)
+      self.__symbols.append(symbol)
+      # First definition of a name takes precedence, as with a linear search.
+      self.__symbols_by_name.setdefault(symbol.get_name(), symbol)
 
   def find_symbol(self, op):
     """Find a symbol by name."""
-    for ii in self.__symbols:
-      if ii.get_name() == op:
-        return ii
-    return None
+    return self.__symbols_by_name.get(op)
 
   def get_name(self):
     """Accessor."""
     return str(self.__name)
 
+  def get_symbols(self):
+    """Accessor."""
+    return self.__symbols
+
+def generate_symbol_index(lst):
+  """Generate a mapping from symbol names to symbols over given library definitions."""
+  ret = {}
+  for ii in lst:
+    for jj in ii.get_symbols():
+      # First definition of a name takes precedence, as with a linear search.
+      ret.setdefault(jj.get_name(), jj)
+  return ret
+
 library_definition_c = LibraryDefinition("c", (
   ("void", "free", "void*"),
   ("void*", "malloc", "size_t"),
@@ -2029,6 +2077,8 @@ library_definitions = [
     library_definition_sdl,
     ]
 
+g_symbol_index = generate_symbol_index(library_definitions)
+
 ########################################
 # C header generation ##################
 ########################################
@@ -2504,16 +2554,16 @@ static struct SymbolTableStruct
 #endif
 """
 
+g_symbol_regex_cache = {}
+
 def analyze_source(source, prefix):
   """Analyze given preprocessed C source for symbol names."""
-  symbolre =  re.compile(r"[\s:;&\|\<\>\=\^\+\-\*/\(\)\?]" + prefix + "([a-zA-Z0-9_]+)[\s\(]")
-  results = symbolre.findall(source, re.MULTILINE)
-  ret = set()
-  for ii in results:
-    symbolset = set()
-    symbolset.add(ii)
-    ret = ret.union(symbolset)
-  return ret
+  if prefix in g_symbol_regex_cache:
+    symbolre = g_symbol_regex_cache[prefix]
+  else:
+    symbolre = re.compile(r"[\s:;&\|\<\>\=\^\+\-\*/\(\)\?]" + prefix + "([a-zA-Z0-9_]+)[\s\(]")
+    g_symbol_regex_cache[prefix] = symbolre
+  return set(symbolre.findall(source))
 
 def generate_loader(mode, symbols, definition, linker):
   """Generate the loader code."""
@@ -2530,19 +2580,17 @@ def generate_loader(mode, symbols, definition, linker):
 
 def generate_loader_dlfcn(symbols, linker):
   """Generate dlopen/dlsym loader code."""
-  dlfcn_string = ""
-  current_lib = None
-  for ii in symbols:
-    symbol_lib = ii.get_library().get_name()
-    if current_lib != symbol_lib:
-      if current_lib:
-        dlfcn_string += "\"\\0%s\\0\"\n" % (ii.get_library_name(linker))
-      else:
-        dlfcn_string += "\"%s\\0\"\n" % (ii.get_library_name(linker))
-      current_lib = symbol_lib
-    dlfcn_string += "\"%s\\0\"\n" % (ii)
-  dlfcn_string += "\"\\0\""
-  return template_loader_dlfcn % (dlfcn_string)
+  dlfcn_lines = []
+  # Symbols are sorted by library, each library name is emitted once before its symbols.
+  for (library_name, library_symbols) in itertools.groupby(symbols, lambda x: x.get_library().get_name()):
+    library_symbols = list(library_symbols)
+    if dlfcn_lines:
+      dlfcn_lines.append("\"\\0%s\\0\"" % (library_symbols[0].get_library_name(linker)))
+    else:
+      dlfcn_lines.append("\"%s\\0\"" % (library_symbols[0].get_library_name(linker)))
+    dlfcn_lines += ["\"%s\\0\"" % (ii) for ii in library_symbols]
+  dlfcn_lines.append("\"\\0\"")
+  return template_loader_dlfcn % ("\n".join(dlfcn_lines))
 
 def generate_loader_hash(symbols):
   """Generate import by hash loader code."""
@@ -2554,26 +2602,22 @@ def generate_loader_vanilla():
 
 def generate_symbol_definitions(mode, symbols, prefix, definition):
   """Generate a listing of definitions from replacement symbols to real symbols."""
-  direct = []
-  tabled = []
-  for ii in symbols:
-    direct += [ii.generate_rename_direct(prefix)]
-    tabled += [ii.generate_rename_tabled(prefix)]
+  direct = [ii.generate_rename_direct(prefix) for ii in symbols]
   if "vanilla" == mode:
     tabled = direct
+  else:
+    tabled = [ii.generate_rename_tabled(prefix) for ii in symbols]
   return template_symbol_definitions % (definition, "\n".join(direct), "\n".join(tabled))
 
 def generate_symbol_struct(mode, symbols, definition):
   """Generate the symbol struct definition."""
   if "vanilla" == mode:
     return ""
-  definitions = []
-  hashes = []
+  definitions = ["  %s;" % (ii.generate_definition()) for ii in symbols]
   symbol_table_content = ""
-  for ii in symbols:
-    definitions += ["  %s;" % (ii.generate_definition())]
-    hashes += ["  %s%s," % (ii.generate_prototype(), ii.get_hash())]
+  # Symbol hashes are only needed if the table is initialized with them.
   if "dlfcn" != mode:
+    hashes = ["  %s%s," % (ii.generate_prototype(), ii.get_hash()) for ii in symbols]
     symbol_table_content = " =\n{\n%s\n}" % ("\n".join(hashes))
   return template_symbol_table % (definition, "\n".join(definitions), symbol_table_content)
 
@@ -2583,16 +2627,20 @@ def generate_symbol_struct(mode, symbols, definition):
 
 def check_executable(op):
   """Check for existence of a single binary."""
-  try:
-    proc = subprocess.Popen([op], stdout = subprocess.PIPE, stderr = subprocess.PIPE)
-  except OSError:
-    return False
-  try:
-    if proc.poll():
-      proc.kill()
-  except OSError:
-    return True
-  return True
+  # Look the binary up like the shell would instead of spawning it.
+  extensions = [""]
+  if "win32" == sys.platform:
+    extensions += os.environ.get("PATHEXT", ".EXE").split(os.pathsep)
+  if os.path.dirname(op):
+    directories = [""]
+  else:
+    directories = os.environ.get("PATH", os.defpath).split(os.pathsep)
+  for ii in directories:
+    for jj in extensions:
+      fname = os.path.join(ii, op + jj)
+      if os.path.isfile(fname) and os.access(fname, os.X_OK):
+        return True
+  return False
 
 def compress_file(compression, pretty, src, dst):
   """Compress a file to be a self-extracting file-dumping executable."""
@@ -2612,10 +2660,11 @@ def compress_file(compression, pretty, src, dst):
     header = "HOME=/tmp/i;%s $0|xzcat>~;chmod +x ~;~%s" % (str_tail, str_cleanup)
   else:
     raise RuntimeError("unknown compression format '%s'" % compression)
-  (compressed, se) = run_command(command + [src], False)
   wfd = open(dst, "wb")
   wfd.write((header + "\n").encode())
-  wfd.write(compressed)
+  # Compressor output goes straight to the file after the header.
+  wfd.flush()
+  run_command(command + [src], False, wfd)
   wfd.close()
   make_executable(dst)
   print("Wrote '%s': %i bytes" % (dst, os.path.getsize(dst)))
@@ -2626,30 +2675,24 @@ def file_is_ascii_text(op):
     return False
   fd = open(op, "rb")
   while True:
-    line = fd.readline()
-    if 0 >= len(line):
+    block = fd.read(65536)
+    if 0 >= len(block):
       fd.close()
       return True
-    try:
-      line.decode("ascii")
-    except UnicodeDecodeError:
+    # Anything left after deleting all ASCII7 characters is not text.
+    if block.translate(None, ASCII7_CHARACTERS):
       fd.close()
       return False
 
 def find_symbol(op):
   """Find single symbol."""
-  for ii in library_definitions:
-    ret = ii.find_symbol(op)
-    if ret:
-      return ret
+  if op in g_symbol_index:
+    return g_symbol_index[op]
   raise RuntimeError("symbol '%s' not known, please add it to the script" % (op))
 
 def find_symbols(lst):
   """Find symbol object(s) corresponding to symbol string(s)."""
-  ret = []
-  for ii in lst:
-    ret += [find_symbol(ii)]
-  return ret
+  return [find_symbol(ii) for ii in lst]
 
 def generate_binary_minimal(source_file, compiler, assembler, linker, objcopy, und_symbols, elfling, libraries,
     output_file):
@@ -2764,18 +2807,25 @@ def generate_binary_minimal(source_file, compiler, assembler, linker, objcopy, u
   run_command([objcopy, "--output-target=binary", output_file + ".bin", output_file + ".unprocessed"])
   readelf_truncate(output_file + ".unprocessed", output_file + ".stripped")
 
+def format_size(op):
+  """Get human-readable string representing given byte count."""
+  for (divisor, unit) in ((1 << 30, "G"), (1 << 20, "M"), (1 << 10, "k")):
+    if divisor < op:
+      return "%1.1f %sbytes" % (float(op) / float(divisor), unit)
+  return "%u bytes" % (op)
+
 def get_platform_und_symbols():
   """Get the UND symbols required for this platform."""
   ret = None
   if osname_is_freebsd():
-    ret = sorted(["environ", "__progname"])
+    ret = ["__progname", "environ"]
   if is_verbose():
     print("Checking for required UND symbols... " + str(ret))
   return ret
 
 def labelify(op):
   """Take string as input. Convert into string that passes as label."""
-  return re.sub(r'[\/\.]', '_', op)
+  return op.replace("/", "_").replace(".", "_")
 
 def listify(lhs, rhs):
   """Make a list of two elements if reasonable."""
@@ -2783,21 +2833,46 @@ def listify(lhs, rhs):
     return rhs
   if not rhs:
     return lhs
-  if is_listing(lhs) and is_listing(rhs):
+  lhs_listing = isinstance(lhs, (list, tuple))
+  rhs_listing = isinstance(rhs, (list, tuple))
+  if lhs_listing and rhs_listing:
     return lhs + rhs
-  if is_listing(lhs):
+  if lhs_listing:
     return lhs + [rhs]
-  if is_listing(rhs):
+  if rhs_listing:
     return [lhs] + rhs
   return [lhs, rhs]
 
+def get_command_family(op):
+  """Get family of given compiler or linker command basename."""
+  if op.startswith("cl."):
+    return "cl"
+  if op.startswith("g++") or op.startswith("gcc"):
+    return "gcc"
+  if op.startswith("clang"):
+    return "clang"
+  if op.startswith("ld"):
+    return "ld"
+  return None
+
 def get_indent(op):
   """Get indentation for given level."""
-  ret = ""
-  for ii in range(op):
-    # Would tab be better?
-    ret += "  "
-  return ret
+  # Would tab be better?
+  return "  " * op
+
+def get_longest_overlap(lhs, rhs):
+  """Get length of longest suffix of lhs that is also a prefix of rhs."""
+  # Knuth-Morris-Pratt failure function over rhs, separator, lhs.
+  sequence = list(rhs) + [None] + list(lhs)
+  failure = [0] * len(sequence)
+  for ii in range(1, len(sequence)):
+    jj = failure[ii - 1]
+    while (0 < jj) and (sequence[ii] != sequence[jj]):
+      jj = failure[jj - 1]
+    if sequence[ii] == sequence[jj]:
+      jj += 1
+    failure[ii] = jj
+  return failure[-1]
 
 def get_push_size(op):
   """Get push side increment for given instruction or register."""
@@ -2833,25 +2908,23 @@ def locate(pth, fn):
       if ret:
         return ret
     return None
-  # Some specific directory trees would take too much time to traverse.
-  if pth in ("/lib/modules"): 
-    return None
-  pthfn = pth + "/" + fn
-  if os.path.isfile(pthfn):
-    return os.path.normpath(pthfn)
-  try:
-    for ii in os.listdir(pth):
-      iifn = pth + "/" + ii
-      if os.path.isdir(iifn):
-        ret = locate(iifn, fn)
-        if ret:
-          return ret
-  except OSError as ee: # Permission denied or the like.
-    if 13 == ee.errno:
-      return None
-    raise ee
+  for (root, dirs, files) in os.walk(pth, onerror = locate_error, followlinks = True):
+    # Some specific directory trees would take too much time to traverse.
+    if root in ("/lib/modules"):
+      dirs[:] = []
+      continue
+    if fn in files:
+      rootfn = os.path.join(root, fn)
+      if os.path.isfile(rootfn):
+        return os.path.normpath(rootfn)
   return None
 
+def locate_error(op):
+  """Error handler for directory traversal in locate()."""
+  # Permission denied or the like, skip the directory.
+  if 13 != op.errno:
+    raise op
+
 def make_executable(op):
   """Make given file executable."""
   if not os.stat(op)[stat.ST_MODE] & stat.S_IXUSR:
@@ -2859,20 +2932,13 @@ def make_executable(op):
 
 def merge_segments(lst):
   """Try to merge segments in a given list in-place."""
-  ii = 0
-  while True:
-    jj = ii + 1
-    if len(lst) <= jj:
-      return lst
-    seg1 = lst[ii]
-    seg2 = lst[jj]
-    if seg1.merge(seg2):
-      if seg2.empty():
-        del lst[jj]
-      else:
-        ii += 1
-    else:
-      ii += 1
+  ret = lst[:1]
+  for ii in lst[1:]:
+    # Segment that was merged completely into the previous one is dropped.
+    if ret[-1].merge(ii) and ii.empty():
+      continue
+    ret.append(ii)
+  lst[:] = ret
   return lst
 
 def osarch_is_32_bit():
@@ -2893,14 +2959,7 @@ def osarch_is_ia32():
 
 def osarch_match(op):
   """Check if osarch matches some chain resulting in given value."""
-  arch = g_osarch
-  while True:
-    if op == arch:
-      return True
-    arch = platform_map_iterate(arch)
-    if not arch:
-      break
-  return False
+  return op in g_osarch_aliases
 
 def osname_is_freebsd():
   """Check if the operating system name maps to FreeBSD."""
@@ -2915,20 +2974,40 @@ def raise_unknown_address_size():
   raise RuntimeError("platform '%s' addressing size unknown" % (g_osarch))
 
 def readelf_get_info(op):
-  """Read information from an ELF file using readelf. Return as dictionary."""
+  """Read information from an ELF file headers. Return as dictionary."""
+  fd = open(op, "rb")
+  data = fd.read()
+  fd.close()
+  if data[:4] != b"\x7fELF":
+    raise RuntimeError("not an ELF file: '%s'" % (op))
+  (ei_class, ei_data) = struct.unpack_from("BB", data, 4)
+  bom = "<"
+  if 2 == ei_data:
+    bom = ">"
+  if 1 == ei_class:
+    (e_entry, e_phoff) = struct.unpack_from(bom + "II", data, 24)
+    (e_phentsize, e_phnum) = struct.unpack_from(bom + "HH", data, 42)
+    phdr_format = bom + "IIIIIII"
+    phdr_fields = (0, 2, 4, 6)
+  elif 2 == ei_class:
+    (e_entry, e_phoff) = struct.unpack_from(bom + "QQ", data, 24)
+    (e_phentsize, e_phnum) = struct.unpack_from(bom + "HH", data, 54)
+    phdr_format = bom + "IIQQQQ"
+    phdr_fields = (0, 3, 5, 1)
+  else:
+    raise RuntimeError("unknown ELF class %i in '%s'" % (ei_class, op))
   ret = {}
-  (so, se) = run_command(["readelf", "--file-header", "--program-headers", op])
-  match = re.search(r'LOAD\s+\S+\s+(\S+)\s+\S+\s+(\S+)\s+\S+\s+RWE', so, re.MULTILINE)
-  if match:
-    ret["base"] = int(match.group(1), 16)
-    ret["size"] = int(match.group(2), 16)
+  # First PT_LOAD with rwx permissions is the program itself.
+  for ii in range(e_phnum):
+    phdr = struct.unpack_from(phdr_format, data, e_phoff + ii * e_phentsize)
+    (p_type, p_vaddr, p_filesz, p_flags) = [phdr[jj] for jj in phdr_fields]
+    if (1 == p_type) and (7 == p_flags):
+      ret["base"] = p_vaddr
+      ret["size"] = p_filesz
+      break
   else:
     raise RuntimeError("could not read first PT_LOAD from executable '%s'" % (op))
-  match = re.search(r'Entry\spoint\saddress:\s+(\S+)', so, re.MULTILINE)
-  if match:
-    ret["entry"] = int(match.group(1), 16) - ret["base"]
-  else:
-    raise RuntimeError("could not read entry point from executable '%s'" % (op))
+  ret["entry"] = e_entry - ret["base"]
   return ret
 
 def readelf_truncate(src, dst):
@@ -2949,13 +3028,15 @@ def readelf_truncate(src, dst):
     rfd.close()
     wfd.close()
 
-def run_command(lst, decode_output = True):
-  """Run program identified by list of command line parameters."""
+def run_command(lst, decode_output = True, stdout_file = None):
+  """Run program identified by list of command line parameters, optionally write standard output into a file."""
   if is_verbose():
     print("Executing command: %s" % (" ".join(lst)))
-  proc = subprocess.Popen(lst, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+  if stdout_file is None:
+    stdout_file = subprocess.PIPE
+  proc = subprocess.Popen(lst, stdout = stdout_file, stderr = subprocess.PIPE)
   (proc_stdout, proc_stderr) = proc.communicate()
-  if decode_output and not isinstance(proc_stdout, str):
+  if decode_output and (proc_stdout is not None) and not isinstance(proc_stdout, str):
     proc_stdout = proc_stdout.decode()
   if decode_output and not isinstance(proc_stderr, str):
     proc_stderr = proc_stderr.decode()
@@ -2966,21 +3047,15 @@ def run_command(lst, decode_output = True):
 
 def search_executable(op, description = None):
   """Check for existence of binary, everything within the list will be tried."""
-  checked = []
   ret = None
   if isinstance(op, (list, tuple)):
     for ii in op:
-      if not ii in checked:
-        if check_executable(ii):
-          ret = ii
-          break
-        else:
-          checked += [ii]
+      if check_executable(ii):
+        ret = ii
+        break
   elif isinstance(op, str):
-    if not op in checked:
-      if check_executable(op):
-        ret = op
-      checked += [op]
+    if check_executable(op):
+      ret = op
   else:
     raise RuntimeError("weird argument given to executable search: %s" % (str(op)))
   if description and is_verbose():
@@ -3014,9 +3089,7 @@ class CustomHelpFormatter(argparse.HelpFormatter):
 
   def _fill_text(self, text, width, indent):
     """Method override."""
-    ret = []
-    for ii in text.splitlines():
-      ret += [textwrap.fill(ii, width, initial_indent=indent, subsequent_indent=indent)]
+    ret = [textwrap.fill(ii, width, initial_indent=indent, subsequent_indent=indent) for ii in text.splitlines()]
     return "\n\n".join(ret)
 
   def _split_lines(self, text, width):
@@ -3024,15 +3097,10 @@ class CustomHelpFormatter(argparse.HelpFormatter):
     indent_len = len(get_indent(1))
     ret = []
     for ii in text.splitlines():
-      indent = 0
-      for jj in range(len(ii)):
-        if not ii[jj].isspace():
-          indent = jj
-          break
-      lines = textwrap.wrap(ii[indent:], width - jj * indent_len)
-      for ii in range(len(lines)):
-        lines[ii] = get_indent(indent) + lines[ii]
-      ret += lines
+      indent = len(ii) - len(ii.lstrip())
+      lines = textwrap.wrap(ii[indent:], width - indent * indent_len)
+      prefix = get_indent(indent)
+      ret += [prefix + jj for jj in lines]
     return ret
 
 ########################################
@@ -3124,6 +3192,7 @@ def main():
     if new_osname != g_osname:
       cross_compile = True
       g_osname = new_osname
+      g_platform_variable_cache.clear()
   if args.output_file:
     output_file = args.output_file
   if args.safe_symtab:
@@ -3191,10 +3260,9 @@ def main():
 
   if 0 >= len(source_files):
     potential_source_files = os.listdir(target_path)
-    sourcere = re.compile(r".*(c|cpp)$")
     for ii in potential_source_files:
-      if sourcere.match(ii):
-        source_files += [target_path + "/" + ii]
+      if ii.endswith((".c", ".cpp")):
+        source_files.append(target_path + "/" + ii)
     if 0 >= len(source_files):
       raise RuntimeError("could not find any source files in '%s'" % (target_path))
 
@@ -3255,31 +3323,30 @@ def main():
   fd.write("\n")
   fd.close()
 
-  symbols = set()
-  for ii in source_files:
-    if is_verbose():
+  if is_verbose():
+    for ii in source_files:
       print("Analyzing source file '%s'." % (ii))
-    source = compiler.preprocess(ii)
-    source_symbols = analyze_source(source, symbol_prefix)
-    symbols = symbols.union(source_symbols)
-  symbols = find_symbols(symbols)
+  # Symbols are collected from all sources together, so preprocess them with one compiler invocation.
+  source = compiler.preprocess(source_files)
+  symbols = find_symbols(analyze_source(source, symbol_prefix))
+  # Sort keys are computed once per symbol, ordering is the same as with Symbol comparison.
   if "dlfcn" == compilation_mode:
-    symbols = sorted(symbols)
+    symbols = sorted(symbols, key = lambda x: (x.get_library().get_name(), x.get_name()))
   elif "maximum" == compilation_mode:
-    symbols = list(map(lambda x: x[1], sorted(map(lambda x: (x.get_hash(), x), symbols))))
+    symbols = sorted(symbols, key = lambda x: (x.get_hash(), x.get_library().get_name(), x.get_name()))
 
   if is_verbose():
     symbol_strings = map(lambda x: str(x), symbols)
     print("Symbols found: ['%s']" % ("', '".join(symbol_strings)))
 
-  file_contents = template_header_begin % (os.path.basename(sys.argv[0]), definition_ld, definition_ld)
-  file_contents += generate_symbol_definitions(compilation_mode, symbols, symbol_prefix, definition_ld)
-  file_contents += generate_symbol_struct(compilation_mode, symbols, definition_ld)
-  file_contents += generate_loader(compilation_mode, symbols, definition_ld, linker)
-  file_contents += template_header_end
+  file_contents = [template_header_begin % (os.path.basename(sys.argv[0]), definition_ld, definition_ld),
+      generate_symbol_definitions(compilation_mode, symbols, symbol_prefix, definition_ld),
+      generate_symbol_struct(compilation_mode, symbols, definition_ld),
+      generate_loader(compilation_mode, symbols, definition_ld, linker),
+      template_header_end]
 
   fd = open(target, "w")
-  fd.write(file_contents)
+  fd.write("".join(file_contents))
   fd.close()
 
   if is_verbose():
@@ -3311,32 +3378,37 @@ def main():
     linker.generate_linker_flags()
     linker.set_libraries(libraries)
     linker.set_library_directories(library_directories)
+    output_file_final_s = output_file + ".final.S"
+    output_file_ld = output_file + ".ld"
+    output_file_o = output_file + ".o"
+    output_file_s = output_file + ".S"
+    output_file_stripped = output_file + ".stripped"
+    output_file_unprocessed = output_file + ".unprocessed"
     if "maximum" == compilation_mode:
       und_symbols = get_platform_und_symbols()
       generate_binary_minimal(source_file, compiler, assembler, linker, objcopy, und_symbols, elfling,
           libraries, output_file)
       # Now have complete binary, may need to reprocess.
       if elfling:
-        elfling.compress(output_file + ".stripped", output_file + ".extracted")
+        elfling.compress(output_file_stripped, output_file + ".extracted")
         generate_binary_minimal(None, compiler, assembler, linker, objcopy, und_symbols, elfling, libraries,
             output_file)
     elif "hash" == compilation_mode:
-      compiler.compile_asm(source_file, output_file + ".S")
-      asm = AssemblerFile(output_file + ".S")
+      compiler.compile_asm(source_file, output_file_s)
+      asm = AssemblerFile(output_file_s)
       asm.remove_rodata()
-      asm.write(output_file + ".final.S", assembler)
-      assembler.assemble(output_file + ".final.S", output_file + ".o")
-      linker.generate_linker_script(output_file + ".ld")
-      linker.set_linker_script(output_file + ".ld")
-      linker.link(output_file + ".o", output_file + ".unprocessed")
+      asm.write(output_file_final_s, assembler)
+      assembler.assemble(output_file_final_s, output_file_o)
+      linker.generate_linker_script(output_file_ld)
+      linker.set_linker_script(output_file_ld)
+      linker.link(output_file_o, output_file_unprocessed)
     elif "dlfcn" == compilation_mode or "vanilla" == compilation_mode:
-      compiler.compile_and_link(source_file, output_file + ".unprocessed")
+      compiler.compile_and_link(source_file, output_file_unprocessed)
     else:
       raise RuntimeError("unknown compilation mode: %s" % str(compilation_mode))
     if compilation_mode in ("vanilla", "dlfcn", "hash"):
-      shutil.copy(output_file + ".unprocessed", output_file + ".stripped")
-      run_command([strip, "-K", ".bss", "-K", ".text", "-K", ".data", "-R", ".comment", "-R", ".eh_frame", "-R", ".eh_frame_hdr", "-R", ".fini", "-R", ".gnu.hash", "-R", ".gnu.version", "-R", ".jcr", "-R", ".note", "-R", ".note.ABI-tag", "-R", ".note.tag", output_file + ".stripped"])
-    compress_file(compression, nice_filedump, output_file + ".stripped", output_file)
+      run_command([strip] + list(STRIP_FLAGS) + ["-o", output_file_stripped, output_file_unprocessed])
+    compress_file(compression, nice_filedump, output_file_stripped, output_file)
 
   return 0
 